@@ -1,9 +1,19 @@
 import os
+import sys
 import time
+import asyncio
 import random
 import logging
 import json
-import redis
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+import redis.asyncio as aioredis
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from opentelemetry import trace, metrics
@@ -19,44 +29,79 @@ from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.redis import RedisInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await redis_pool.disconnect()
 
-def setup_otel(service_name: str) -> None:
-    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://edot-agent:4318").rstrip("/")
-    resource = Resource.create({
-        "service.name": service_name,
-        "deployment.environment": os.getenv("DEPLOYMENT_ENV", "local"),
-    })
 
+app = FastAPI(lifespan=lifespan)
+
+
+_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "backend")
+_OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://edot-agent:4318").rstrip("/")
+_TRACE_URL = f"{_OTEL_ENDPOINT}/v1/traces"
+_LOG_URL = f"{_OTEL_ENDPOINT}/v1/logs"
+_METRIC_URL = f"{_OTEL_ENDPOINT}/v1/metrics"
+_OTLP_ADAPTER = HTTPAdapter()
+_LOG_SINK = os.getenv("LOG_SINK", "stdout").lower()
+if _LOG_SINK not in ("stdout", "otlp", "both"):
+    raise ValueError(f"LOG_SINK must be stdout, otlp or both, got {_LOG_SINK!r}")
+_RESOURCE = Resource.create({
+    "service.name": _SERVICE_NAME,
+    "deployment.environment": os.getenv("DEPLOYMENT_ENV", "local"),
+})
+
+
+def otlp_session() -> requests.Session:
+    session = requests.Session()
+    session.mount("http://", _OTLP_ADAPTER)
+    session.mount("https://", _OTLP_ADAPTER)
+    return session
+
+
+def setup_otel(resource: Resource, trace_url: str, metric_url: str) -> None:
     tracer_provider = TracerProvider(resource=resource)
     tracer_provider.add_span_processor(
-        BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces"))
+        BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=trace_url, session=otlp_session()),
+            max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+            max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+            schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+            export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+        )
     )
     trace.set_tracer_provider(tracer_provider)
 
-    logger_provider = LoggerProvider(resource=resource)
-    logger_provider.add_log_record_processor(
-        BatchLogRecordProcessor(OTLPLogExporter(endpoint=f"{endpoint}/v1/logs"))
-    )
-    handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
-    logging.getLogger().addHandler(handler)
-    logging.getLogger().setLevel(logging.INFO)
-
     metric_reader = PeriodicExportingMetricReader(
-        OTLPMetricExporter(endpoint=f"{endpoint}/v1/metrics"),
+        OTLPMetricExporter(endpoint=metric_url, session=otlp_session()),
         export_interval_millis=5000,
     )
     meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader])
     metrics.set_meter_provider(meter_provider)
 
 
-setup_otel(os.getenv("OTEL_SERVICE_NAME", "backend"))
-FastAPIInstrumentor.instrument_app(app)
+def setup_otlp_logging(resource: Resource, log_url: str) -> logging.Handler:
+    logger_provider = LoggerProvider(resource=resource)
+    logger_provider.add_log_record_processor(
+        BatchLogRecordProcessor(
+            OTLPLogExporter(endpoint=log_url, session=otlp_session()),
+            max_queue_size=int(os.getenv("OTEL_BLRP_MAX_QUEUE_SIZE", "4096")),
+            max_export_batch_size=int(os.getenv("OTEL_BLRP_MAX_EXPORT_BATCH_SIZE", "256")),
+            schedule_delay_millis=int(os.getenv("OTEL_BLRP_SCHEDULE_DELAY", "1000")),
+            export_timeout_millis=int(os.getenv("OTEL_BLRP_EXPORT_TIMEOUT", "10000")),
+        )
+    )
+    handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
+    handler.addFilter(lambda record: not record.name.startswith("opentelemetry"))
+    return handler
+
+
+setup_otel(_RESOURCE, _TRACE_URL, _METRIC_URL)
+FastAPIInstrumentor.instrument_app(app, excluded_urls="healthz,metrics")
 RedisInstrumentor().instrument()
-LoggingInstrumentor().instrument(set_logging_format=True)
 
 def parse_resource_attributes(raw: str) -> dict:
     attrs = {}
@@ -74,49 +119,130 @@ def parse_resource_attributes(raw: str) -> dict:
 RESOURCE_ATTRS = parse_resource_attributes(os.getenv("OTEL_RESOURCE_ATTRIBUTES", ""))
 
 
-class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
-        service_name = getattr(record, "otelServiceName", "") or os.getenv("OTEL_SERVICE_NAME", "backend")
-        payload = {
-            "@timestamp": self.formatTime(record, datefmt="%Y-%m-%dT%H:%M:%S.%fZ"),
-            "log.level": record.levelname,
-            "message": record.getMessage(),
-            "logger.name": record.name,
-            "trace.id": getattr(record, "otelTraceID", ""),
-            "span.id": getattr(record, "otelSpanID", ""),
-            "service.name": service_name,
-            "service.version": RESOURCE_ATTRS.get("service.version", ""),
-            "service.namespace": RESOURCE_ATTRS.get("service.namespace", ""),
-            "deployment.environment": RESOURCE_ATTRS.get("deployment.environment", ""),
-            "host.name": os.getenv("HOSTNAME", ""),
-            "event.dataset": f"{service_name}.log",
-        }
-        for key, value in record.__dict__.items():
-            if key in payload or key.startswith("otel"):
-                continue
-            if key in ("args", "msg", "levelname", "levelno", "pathname", "filename", "module",
-                       "exc_info", "exc_text", "stack_info", "lineno", "funcName", "created",
-                       "msecs", "relativeCreated", "thread", "threadName", "processName", "process"):
-                continue
+def format_timestamp(record: logging.LogRecord) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+def dumps_json_line(payload: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(payload) + "\n").encode()
+
+
+_get_current_span = trace.get_current_span
+_BUILTIN_LOGRECORD_ATTRS = (
+    frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__)
+    | {"message", "asctime"}
+)
+_BASE_PAYLOAD = {
+    "@timestamp": "",
+    "log.level": "",
+    "message": "",
+    "logger.name": "",
+    "trace.id": "",
+    "span.id": "",
+    "service.name": _SERVICE_NAME,
+    "service.version": RESOURCE_ATTRS.get("service.version", ""),
+    "service.namespace": RESOURCE_ATTRS.get("service.namespace", ""),
+    "deployment.environment": RESOURCE_ATTRS.get("deployment.environment", ""),
+    "host.name": os.getenv("HOSTNAME", ""),
+    "event.dataset": f"{_SERVICE_NAME}.log",
+}
+
+
+def build_log_payload(record: logging.LogRecord) -> dict:
+    payload = _BASE_PAYLOAD.copy()
+    payload["@timestamp"] = format_timestamp(record)
+    payload["log.level"] = record.levelname
+    payload["message"] = record.getMessage()
+    payload["logger.name"] = record.name
+    span_context = _get_current_span().get_span_context()
+    if span_context.is_valid:
+        payload["trace.id"] = format(span_context.trace_id, "032x")
+        payload["span.id"] = format(span_context.span_id, "016x")
+    for key, value in record.__dict__.items():
+        if key not in _BUILTIN_LOGRECORD_ATTRS:
             payload[key] = value
-        return json.dumps(payload)
+    return payload
+
+
+class JsonStreamHandler(logging.StreamHandler):
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = dumps_json_line(build_log_payload(record))
+            buffer = getattr(self.stream, "buffer", None)
+            if buffer is not None:
+                buffer.write(data)
+            else:
+                self.stream.write(data.decode())
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
-handler = logging.StreamHandler()
-handler.setFormatter(JsonFormatter())
 root_logger = logging.getLogger()
-root_logger.handlers = [handler]
-root_logger.setLevel(logging.INFO)
+root_logger.handlers = []
+if _LOG_SINK in ("stdout", "both"):
+    root_logger.addHandler(JsonStreamHandler())
+if _LOG_SINK in ("otlp", "both"):
+    root_logger.addHandler(setup_otlp_logging(_RESOURCE, _LOG_URL))
+root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+_ARTIFICIAL_DELAY = float(os.getenv("BACKEND_ARTIFICIAL_DELAY_S", "0"))
+_BATCH_MAX_OPS = int(os.getenv("BATCH_MAX_OPS", "100"))
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+redis_pool = aioredis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    max_connections=int(os.getenv("REDIS_POOL_SIZE", "128")),
+    timeout=float(os.getenv("REDIS_POOL_TIMEOUT_S", "5")),
+    socket_keepalive=True,
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
 
 meter = metrics.get_meter("backend")
 request_counter = meter.create_counter("backend.requests", description="Backend requests")
 latency_hist = meter.create_histogram("backend.latency_ms", description="Backend latency ms")
 tracer = trace.get_tracer("backend")
+_start_span = tracer.start_as_current_span
+_counter_add = request_counter.add
+_hist_record = latency_hist.record
 logger = logging.getLogger("backend")
+_INFO_ENABLED = logger.isEnabledFor(logging.INFO)
+
+
+class FastLogger:
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+
+    def info_event(self, msg: str, **fields) -> None:
+        if not _INFO_ENABLED:
+            return
+        clashes = _BUILTIN_LOGRECORD_ATTRS.intersection(fields)
+        if clashes:
+            raise KeyError(f"Attempt to overwrite {sorted(clashes)} in LogRecord")
+        caller = sys._getframe(1)
+        code = caller.f_code
+        record = self.logger.makeRecord(
+            self.logger.name, logging.INFO, code.co_filename, caller.f_lineno, msg, None, None, func=code.co_name
+        )
+        record.__dict__.update(fields)
+        self.logger.handle(record)
+
+
+event_logger = FastLogger(logger)
+
+_ATTR_API = {"route": "/api"}
+_ATTR_POST_ITEMS = {"route": "POST /api/items"}
+_ATTR_BATCH_ITEMS = {"route": "POST /api/items/batch"}
+_ATTR_GET_ITEMS = {"route": "GET /api/items"}
+_ATTR_PUT_ITEMS = {"route": "PUT /api/items"}
+_ATTR_DELETE_ITEMS = {"route": "DELETE /api/items"}
+_ATTR_SLOW = {"route": "GET /api/slow"}
 
 
 class Item(BaseModel):
@@ -124,96 +250,134 @@ class Item(BaseModel):
     value: str
 
 
+class ItemOp(BaseModel):
+    op: Literal["set", "get", "delete"]
+    key: str
+    value: Optional[str] = None
+
+
 @app.get("/api")
-def api() -> dict:
-    start = time.time()
-    with tracer.start_as_current_span("redis.get_and_set") as span:
-        hits = redis_client.incr("hits")
+async def api() -> dict:
+    start = time.perf_counter_ns()
+    with _start_span("redis.get_and_set") as span:
+        hits = await redis_client.incr("hits")
         span.set_attribute("db.system", "redis")
-        time.sleep(0.01)
-    duration_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "/api"})
-    latency_hist.record(duration_ms, {"route": "/api"})
-    logger.info("backend api", extra={"hits": hits, "latency_ms": duration_ms})
+        if _ARTIFICIAL_DELAY:
+            await asyncio.sleep(_ARTIFICIAL_DELAY)
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_API)
+    _hist_record(duration_ms, _ATTR_API)
+    event_logger.info_event("backend api", hits=hits, latency_ms=duration_ms)
     return {"message": "hello from backend", "hits": hits}
 
 
 @app.post("/api/items")
-def create_item(item: Item) -> dict:
-    start = time.time()
-    with tracer.start_as_current_span("redis.create_item") as span:
+async def create_item(item: Item) -> dict:
+    start = time.perf_counter_ns()
+    with _start_span("redis.create_item") as span:
         span.set_attribute("item.key", item.key)
-        ok = redis_client.set(item.key, item.value)
-        time.sleep(0.01)
+        ok = await redis_client.set(item.key, item.value)
+        if _ARTIFICIAL_DELAY:
+            await asyncio.sleep(_ARTIFICIAL_DELAY)
     if not ok:
         raise HTTPException(status_code=500, detail="failed to write")
-    duration_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "POST /api/items"})
-    latency_hist.record(duration_ms, {"route": "POST /api/items"})
-    logger.info("item created", extra={"key": item.key, "latency_ms": duration_ms})
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_POST_ITEMS)
+    _hist_record(duration_ms, _ATTR_POST_ITEMS)
+    event_logger.info_event("item created", key=item.key, latency_ms=duration_ms)
     return {"status": "created", "key": item.key}
 
 
+@app.post("/api/items/batch")
+async def batch_items(ops: list[ItemOp]) -> dict:
+    if len(ops) > _BATCH_MAX_OPS:
+        raise HTTPException(status_code=422, detail=f"batch exceeds {_BATCH_MAX_OPS} ops")
+    for op in ops:
+        if op.op == "set" and op.value is None:
+            raise HTTPException(status_code=422, detail=f"missing value for set {op.key}")
+    start = time.perf_counter_ns()
+    with _start_span("redis.batch_items") as span:
+        span.set_attribute("batch.size", len(ops))
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for op in ops:
+                if op.op == "set":
+                    pipe.set(op.key, op.value)
+                elif op.op == "get":
+                    pipe.get(op.key)
+                else:
+                    pipe.delete(op.key)
+            results = [r.decode() if isinstance(r, bytes) else r for r in await pipe.execute()]
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_BATCH_ITEMS)
+    _hist_record(duration_ms, _ATTR_BATCH_ITEMS)
+    event_logger.info_event("items batch", ops=len(ops), latency_ms=duration_ms)
+    return {"status": "ok", "results": results}
+
+
 @app.get("/api/items/{key}")
-def get_item(key: str) -> dict:
-    start = time.time()
-    with tracer.start_as_current_span("redis.get_item") as span:
+async def get_item(key: str) -> dict:
+    start = time.perf_counter_ns()
+    with _start_span("redis.get_item") as span:
         span.set_attribute("item.key", key)
-        value = redis_client.get(key)
-        time.sleep(0.005)
-    duration_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "GET /api/items"})
-    latency_hist.record(duration_ms, {"route": "GET /api/items"})
+        value = await redis_client.get(key)
+        if _ARTIFICIAL_DELAY:
+            await asyncio.sleep(_ARTIFICIAL_DELAY)
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_GET_ITEMS)
+    _hist_record(duration_ms, _ATTR_GET_ITEMS)
     if value is None:
         logger.warning("item not found", extra={"key": key})
         raise HTTPException(status_code=404, detail="not found")
-    logger.info("item fetched", extra={"key": key, "latency_ms": duration_ms})
-    return {"key": key, "value": value}
+    event_logger.info_event("item fetched", key=key, latency_ms=duration_ms)
+    return {"key": key, "value": value.decode()}
 
 
 @app.put("/api/items/{key}")
-def update_item(key: str, item: Item) -> dict:
-    start = time.time()
-    with tracer.start_as_current_span("redis.update_item") as span:
+async def update_item(key: str, item: Item) -> dict:
+    start = time.perf_counter_ns()
+    with _start_span("redis.update_item") as span:
         span.set_attribute("item.key", key)
-        redis_client.set(key, item.value)
-        time.sleep(0.008)
-    duration_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "PUT /api/items"})
-    latency_hist.record(duration_ms, {"route": "PUT /api/items"})
-    logger.info("item updated", extra={"key": key, "latency_ms": duration_ms})
+        await redis_client.set(key, item.value)
+        if _ARTIFICIAL_DELAY:
+            await asyncio.sleep(_ARTIFICIAL_DELAY)
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_PUT_ITEMS)
+    _hist_record(duration_ms, _ATTR_PUT_ITEMS)
+    event_logger.info_event("item updated", key=key, latency_ms=duration_ms)
     return {"status": "updated", "key": key}
 
 
 @app.delete("/api/items/{key}")
-def delete_item(key: str) -> dict:
-    start = time.time()
-    with tracer.start_as_current_span("redis.delete_item") as span:
+async def delete_item(key: str) -> dict:
+    start = time.perf_counter_ns()
+    with _start_span("redis.delete_item") as span:
         span.set_attribute("item.key", key)
-        deleted = redis_client.delete(key)
-        time.sleep(0.004)
-    duration_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "DELETE /api/items"})
-    latency_hist.record(duration_ms, {"route": "DELETE /api/items"})
+        deleted = await redis_client.delete(key)
+        if _ARTIFICIAL_DELAY:
+            await asyncio.sleep(_ARTIFICIAL_DELAY)
+    duration_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_DELETE_ITEMS)
+    _hist_record(duration_ms, _ATTR_DELETE_ITEMS)
     if deleted == 0:
         logger.warning("item delete miss", extra={"key": key})
         raise HTTPException(status_code=404, detail="not found")
-    logger.info("item deleted", extra={"key": key, "latency_ms": duration_ms})
+    event_logger.info_event("item deleted", key=key, latency_ms=duration_ms)
     return {"status": "deleted", "key": key}
 
 
 @app.get("/api/slow")
-def slow() -> dict:
+async def slow() -> dict:
     delay = random.uniform(0.05, 0.2)
-    with tracer.start_as_current_span("backend.slow_work") as span:
-        span.set_attribute("delay_ms", int(delay * 1000))
-        time.sleep(delay)
-    request_counter.add(1, {"route": "GET /api/slow"})
-    latency_hist.record(int(delay * 1000), {"route": "GET /api/slow"})
-    logger.info("slow request", extra={"delay_ms": int(delay * 1000)})
-    return {"status": "ok", "delay_ms": int(delay * 1000)}
+    delay_ms = int(delay * 1000)
+    with _start_span("backend.slow_work") as span:
+        span.set_attribute("delay_ms", delay_ms)
+        await asyncio.sleep(delay)
+    _counter_add(1, _ATTR_SLOW)
+    _hist_record(delay_ms, _ATTR_SLOW)
+    event_logger.info_event("slow request", delay_ms=delay_ms)
+    return {"status": "ok", "delay_ms": delay_ms}
 
 
 @app.get("/healthz")
-def healthz() -> dict:
+async def healthz() -> dict:
     return {"status": "ok"}
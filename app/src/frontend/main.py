@@ -1,8 +1,17 @@
 import os
+import sys
 import time
+import asyncio
 import logging
 import json
+from contextlib import asynccontextmanager
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from fastapi import FastAPI
 from opentelemetry import trace, metrics
 from opentelemetry.sdk.resources import Resource
@@ -16,45 +25,80 @@ from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
+from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await client.aclose()
 
-def setup_otel(service_name: str) -> None:
-    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://edot-agent:4318").rstrip("/")
-    resource = Resource.create({
-        "service.name": service_name,
-        "deployment.environment": os.getenv("DEPLOYMENT_ENV", "local"),
-    })
 
+app = FastAPI(lifespan=lifespan)
+
+
+_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "frontend")
+_OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://edot-agent:4318").rstrip("/")
+_TRACE_URL = f"{_OTEL_ENDPOINT}/v1/traces"
+_LOG_URL = f"{_OTEL_ENDPOINT}/v1/logs"
+_METRIC_URL = f"{_OTEL_ENDPOINT}/v1/metrics"
+_OTLP_ADAPTER = HTTPAdapter()
+_LOG_SINK = os.getenv("LOG_SINK", "stdout").lower()
+if _LOG_SINK not in ("stdout", "otlp", "both"):
+    raise ValueError(f"LOG_SINK must be stdout, otlp or both, got {_LOG_SINK!r}")
+_RESOURCE = Resource.create({
+    "service.name": _SERVICE_NAME,
+    "deployment.environment": os.getenv("DEPLOYMENT_ENV", "local"),
+})
+
+
+def otlp_session() -> requests.Session:
+    session = requests.Session()
+    session.mount("http://", _OTLP_ADAPTER)
+    session.mount("https://", _OTLP_ADAPTER)
+    return session
+
+
+def setup_otel(resource: Resource, trace_url: str, metric_url: str) -> None:
     tracer_provider = TracerProvider(resource=resource)
     tracer_provider.add_span_processor(
-        BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces"))
+        BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=trace_url, session=otlp_session()),
+            max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+            max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+            schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+            export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+        )
     )
     trace.set_tracer_provider(tracer_provider)
 
-    logger_provider = LoggerProvider(resource=resource)
-    logger_provider.add_log_record_processor(
-        BatchLogRecordProcessor(OTLPLogExporter(endpoint=f"{endpoint}/v1/logs"))
-    )
-    handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
-    logging.getLogger().addHandler(handler)
-    logging.getLogger().setLevel(logging.INFO)
-
     metric_reader = PeriodicExportingMetricReader(
-        OTLPMetricExporter(endpoint=f"{endpoint}/v1/metrics"),
+        OTLPMetricExporter(endpoint=metric_url, session=otlp_session()),
         export_interval_millis=5000,
     )
     meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader])
     metrics.set_meter_provider(meter_provider)
 
 
-setup_otel(os.getenv("OTEL_SERVICE_NAME", "frontend"))
-FastAPIInstrumentor.instrument_app(app)
-RequestsInstrumentor().instrument()
-LoggingInstrumentor().instrument(set_logging_format=True)
+def setup_otlp_logging(resource: Resource, log_url: str) -> logging.Handler:
+    logger_provider = LoggerProvider(resource=resource)
+    logger_provider.add_log_record_processor(
+        BatchLogRecordProcessor(
+            OTLPLogExporter(endpoint=log_url, session=otlp_session()),
+            max_queue_size=int(os.getenv("OTEL_BLRP_MAX_QUEUE_SIZE", "4096")),
+            max_export_batch_size=int(os.getenv("OTEL_BLRP_MAX_EXPORT_BATCH_SIZE", "256")),
+            schedule_delay_millis=int(os.getenv("OTEL_BLRP_SCHEDULE_DELAY", "1000")),
+            export_timeout_millis=int(os.getenv("OTEL_BLRP_EXPORT_TIMEOUT", "10000")),
+        )
+    )
+    handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
+    handler.addFilter(lambda record: not record.name.startswith("opentelemetry"))
+    return handler
+
+
+setup_otel(_RESOURCE, _TRACE_URL, _METRIC_URL)
+FastAPIInstrumentor.instrument_app(app, excluded_urls="healthz,metrics")
+HTTPXClientInstrumentor().instrument()
 
 def parse_resource_attributes(raw: str) -> dict:
     attrs = {}
@@ -72,55 +116,134 @@ def parse_resource_attributes(raw: str) -> dict:
 RESOURCE_ATTRS = parse_resource_attributes(os.getenv("OTEL_RESOURCE_ATTRIBUTES", ""))
 
 
-class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
-        service_name = getattr(record, "otelServiceName", "") or os.getenv("OTEL_SERVICE_NAME", "frontend")
-        payload = {
-            "@timestamp": self.formatTime(record, datefmt="%Y-%m-%dT%H:%M:%S.%fZ"),
-            "log.level": record.levelname,
-            "message": record.getMessage(),
-            "logger.name": record.name,
-            "trace.id": getattr(record, "otelTraceID", ""),
-            "span.id": getattr(record, "otelSpanID", ""),
-            "service.name": service_name,
-            "service.version": RESOURCE_ATTRS.get("service.version", ""),
-            "service.namespace": RESOURCE_ATTRS.get("service.namespace", ""),
-            "deployment.environment": RESOURCE_ATTRS.get("deployment.environment", ""),
-            "host.name": os.getenv("HOSTNAME", ""),
-            "event.dataset": f"{service_name}.log",
-        }
-        for key, value in record.__dict__.items():
-            if key in payload or key.startswith("otel"):
-                continue
-            if key in ("args", "msg", "levelname", "levelno", "pathname", "filename", "module",
-                       "exc_info", "exc_text", "stack_info", "lineno", "funcName", "created",
-                       "msecs", "relativeCreated", "thread", "threadName", "processName", "process"):
-                continue
+def format_timestamp(record: logging.LogRecord) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+def dumps_json_line(payload: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(payload) + "\n").encode()
+
+
+_get_current_span = trace.get_current_span
+_BUILTIN_LOGRECORD_ATTRS = (
+    frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__)
+    | {"message", "asctime"}
+)
+_BASE_PAYLOAD = {
+    "@timestamp": "",
+    "log.level": "",
+    "message": "",
+    "logger.name": "",
+    "trace.id": "",
+    "span.id": "",
+    "service.name": _SERVICE_NAME,
+    "service.version": RESOURCE_ATTRS.get("service.version", ""),
+    "service.namespace": RESOURCE_ATTRS.get("service.namespace", ""),
+    "deployment.environment": RESOURCE_ATTRS.get("deployment.environment", ""),
+    "host.name": os.getenv("HOSTNAME", ""),
+    "event.dataset": f"{_SERVICE_NAME}.log",
+}
+
+
+def build_log_payload(record: logging.LogRecord) -> dict:
+    payload = _BASE_PAYLOAD.copy()
+    payload["@timestamp"] = format_timestamp(record)
+    payload["log.level"] = record.levelname
+    payload["message"] = record.getMessage()
+    payload["logger.name"] = record.name
+    span_context = _get_current_span().get_span_context()
+    if span_context.is_valid:
+        payload["trace.id"] = format(span_context.trace_id, "032x")
+        payload["span.id"] = format(span_context.span_id, "016x")
+    for key, value in record.__dict__.items():
+        if key not in _BUILTIN_LOGRECORD_ATTRS:
             payload[key] = value
-        return json.dumps(payload)
+    return payload
+
+
+class JsonStreamHandler(logging.StreamHandler):
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = dumps_json_line(build_log_payload(record))
+            buffer = getattr(self.stream, "buffer", None)
+            if buffer is not None:
+                buffer.write(data)
+            else:
+                self.stream.write(data.decode())
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
-handler = logging.StreamHandler()
-handler.setFormatter(JsonFormatter())
 root_logger = logging.getLogger()
-root_logger.handlers = [handler]
-root_logger.setLevel(logging.INFO)
+root_logger.handlers = []
+if _LOG_SINK in ("stdout", "both"):
+    root_logger.addHandler(JsonStreamHandler())
+if _LOG_SINK in ("otlp", "both"):
+    root_logger.addHandler(setup_otlp_logging(_RESOURCE, _LOG_URL))
+root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8080")
+_BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "256"))
+client = httpx.AsyncClient(
+    base_url=BACKEND_URL,
+    timeout=httpx.Timeout(2, pool=float(os.getenv("BACKEND_POOL_TIMEOUT_S", "10"))),
+    limits=httpx.Limits(max_connections=_BACKEND_POOL_SIZE, max_keepalive_connections=_BACKEND_POOL_SIZE),
+)
 tracer = trace.get_tracer("frontend")
 meter = metrics.get_meter("frontend")
 request_counter = meter.create_counter("frontend.requests", description="Frontend requests")
+_start_span = tracer.start_as_current_span
+_counter_add = request_counter.add
 logger = logging.getLogger("frontend")
+_INFO_ENABLED = logger.isEnabledFor(logging.INFO)
+
+
+class FastLogger:
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+
+    def info_event(self, msg: str, **fields) -> None:
+        if not _INFO_ENABLED:
+            return
+        clashes = _BUILTIN_LOGRECORD_ATTRS.intersection(fields)
+        if clashes:
+            raise KeyError(f"Attempt to overwrite {sorted(clashes)} in LogRecord")
+        caller = sys._getframe(1)
+        code = caller.f_code
+        record = self.logger.makeRecord(
+            self.logger.name, logging.INFO, code.co_filename, caller.f_lineno, msg, None, None, func=code.co_name
+        )
+        record.__dict__.update(fields)
+        self.logger.handle(record)
+
+
+event_logger = FastLogger(logger)
+
+_ATTR_INDEX = {"route": "/"}
+_ATTR_SIMULATE = {"route": "/simulate"}
+
+SIMULATE_OPS = [
+    {"op": "set", "key": "alpha", "value": "one"},
+    {"op": "get", "key": "alpha"},
+    {"op": "set", "key": "alpha", "value": "two"},
+    {"op": "delete", "key": "alpha"},
+]
 
 
 @app.get("/")
-def index() -> str:
-    start = time.time()
-    response = requests.get(f"{BACKEND_URL}/api", timeout=2)
-    elapsed_ms = int((time.time() - start) * 1000)
-    request_counter.add(1, {"route": "/"})
+async def index() -> str:
+    start = time.perf_counter_ns()
+    response = await client.get("/api")
+    elapsed_ms = (time.perf_counter_ns() - start) // 1_000_000
+    _counter_add(1, _ATTR_INDEX)
     data = response.json()
-    logger.info("frontend index", extra={"backend_hits": data.get("hits"), "latency_ms": elapsed_ms})
+    event_logger.info_event("frontend index", backend_hits=data.get("hits"), latency_ms=elapsed_ms)
     return (
         f"<h1>Frontend</h1>"
         f"<p>Backend message: {data.get('message')}</p>"
@@ -130,19 +253,18 @@ def index() -> str:
 
 
 @app.get("/simulate")
-def simulate() -> dict:
-    with tracer.start_as_current_span("frontend.simulate") as span:
+async def simulate() -> dict:
+    with _start_span("frontend.simulate") as span:
         span.set_attribute("client.workload", "mix")
-        requests.post(f"{BACKEND_URL}/api/items", json={"key": "alpha", "value": "one"}, timeout=2)
-        requests.get(f"{BACKEND_URL}/api/items/alpha", timeout=2)
-        requests.put(f"{BACKEND_URL}/api/items/alpha", json={"key": "alpha", "value": "two"}, timeout=2)
-        requests.delete(f"{BACKEND_URL}/api/items/alpha", timeout=2)
-        requests.get(f"{BACKEND_URL}/api/slow", timeout=2)
-    request_counter.add(1, {"route": "/simulate"})
-    logger.info("frontend simulate complete")
+        await asyncio.gather(
+            client.post("/api/items/batch", json=SIMULATE_OPS),
+            client.get("/api/slow"),
+        )
+    _counter_add(1, _ATTR_SIMULATE)
+    event_logger.info_event("frontend simulate complete")
     return {"status": "ok"}
 
 
 @app.get("/healthz")
-def healthz() -> dict:
+async def healthz() -> dict:
     return {"status": "ok"}